@@ -26,4 +26,51 @@ data.
 .. moduleauthor:: Matthew Dillon <mrdillon@alaska.edu>
 """
 
-from ._backend import SNAPDataSet, GeoRefData, mkdir_p, wgs84_to_ne, ne_to_wgs
+import importlib
+import sys
+
+
+# Public names and the modules they live in. Modules are only imported when
+# one of their names is first used, so importing akextract (and, for
+# example, querying a stored index table) never loads GDAL.
+_exports = {
+    'EXTRACTED_DTYPE': '_backend',
+    'SNAPDataSet': '_backend',
+    'GeoRefData': '_backend',
+    'mkdir_p': '_backend',
+    'wgs84_to_ne': '_backend',
+    'ne_to_wgs': '_backend',
+    'SiteCatalog': '_sites',
+    'EnsembleAccumulator': '_ensemble',
+    'extract_ensemble': '_ensemble',
+    'CLIMATE_INDICES': '_indices',
+    'build_index_tables': '_indices',
+    'load_index_tables': '_indices',
+    'query_index_tables': '_indices',
+    'SharedResultBuffer': '_shared',
+    'CancellationToken': '_aio',
+    'extract_points_async': '_aio',
+}
+
+__all__ = sorted(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(''.join(['module ', repr(__name__),
+                                      ' has no attribute ', repr(name)]))
+    value = getattr(importlib.import_module(''.join(['.', _exports[name]]),
+                                            __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
+
+
+if sys.version_info < (3, 7):
+    # No module __getattr__, so import everything up front
+    for _name in __all__:
+        if _exports[_name] not in ('_aio', '_shared'):
+            globals()[_name] = __getattr__(_name)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+.. :module:: aio
+   :platform: Unix
+   :synopsis: asyncio front-end for extracting from the raw datasets.
+
+.. moduleauthor:: Matthew Dillon <mrdillon@alaska.edu>
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import threading
+
+from ._backend import extraction_array
+
+
+# Classes
+class CancellationToken:
+    """
+    A flag shared between a caller and a running extraction. Once cancelled,
+    the extraction stops queueing reads and raises asyncio.CancelledError.
+    Safe to cancel from any thread.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+
+    def cancel(self):
+        """
+        Request that the extraction stop.
+        """
+        self._event.set()
+
+
+    @property
+    def cancelled(self):
+        """
+        Whether cancellation has been requested.
+        """
+        return self._event.is_set()
+
+
+# Functions
+async def extract_points_async(dataset, northing, easting, start_year,
+                               end_year, read_ahead=2, executor=None,
+                               cancel=None):
+    """
+    Extract points from range of years between start and end at the
+    specified points (Jan->Dec), without blocking the event loop. GeoTIFF
+    reads run in an executor and up to read_ahead months are prefetched
+    while the current month is being indexed.
+
+    :param dataset: a GeoRefData object
+    :param northing: position northing (in meters)
+    :param easting: position easting (in meters)
+    :param start_year: 4-digit year for start of analysis period
+    :param end_year: 4-digit year for end of analysis period, same as
+                     start_year if only analyzing one year
+    :param read_ahead: number of months to read ahead of the one being
+                       indexed
+    :param executor: concurrent.futures executor for the reads, defaults to
+                     a private single-thread executor
+    :param cancel: optional CancellationToken; once cancelled no further
+                   months are read
+    :returns: numpy array of extracted temperatures
+    """
+    loop = asyncio.get_running_loop()
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    x_offsets, y_offsets = dataset.ne_to_indices(northing, easting)
+    # Flag points off the grid before anything is read
+    x_offsets, y_offsets, inside = dataset.in_domain(x_offsets, y_offsets)
+    years = list(range(start_year, end_year + 1))
+    months = itertools.product(years, range(1, 13))
+    extracted_temps = extraction_array(len(x_offsets), len(years))
+
+    pending = collections.deque()
+    def fill():
+        for year, month in itertools.islice(months,
+                                            read_ahead + 1 - len(pending)):
+            pending.append((year, month, loop.run_in_executor(
+                executor, dataset.read_geotiff_as_array, month, year)))
+
+    try:
+        i = 0
+        fill()
+        while pending:
+            if cancel is not None and cancel.cancelled:
+                raise asyncio.CancelledError()
+            year, month, future = pending.popleft()
+            temp_data = await future
+            if cancel is not None and cancel.cancelled:
+                raise asyncio.CancelledError()
+            fill()
+            dataset.extract_month(extracted_temps, i, year, month, temp_data,
+                                  x_offsets, y_offsets, inside)
+            temp_data = None
+            i += 1
+    finally:
+        for year, month, future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=False)
+    return extracted_temps
@@ -10,14 +10,22 @@
 """
 
 import zipfile
-import gdal
 import numpy
 import itertools
 import os
 import errno
-from osgeo import osr
-import sqlite3
-import shutil
+
+from ._indices import (index_table_prefix, build_index_tables,
+                       load_index_tables, take_index_tables, clamp_to_grid)
+from ._sites import safe_name
+
+
+# Record structure of extracted temperatures: (Year, Month, Temperature,
+# Valid). Temperatures that fall outside the grid or on nodata are NaN, and
+# flagged as not valid.
+EXTRACTED_DTYPE = numpy.dtype({'names': ['year', 'month', 'temperature',
+                                         'valid'],
+                               'formats': ['i4', 'i4', 'f4', '?']})
 
 
 # Classes
@@ -69,17 +77,20 @@ class SNAPDataSet:
         """
         Given a set of extracted temperatures, generate csv output of data.
 
-        :param communities: Python list of community names
+        :param communities: Python list of community names, or a
+                            SiteCatalog (whose precomputed safe names are
+                            used as they are)
         :param extracted_temps: Numpy array with extracted temps
         :param out: path to output directory
         """
         min_year = numpy.min(extracted_temps['year'])
         max_year = numpy.max(extracted_temps['year'])
         time_years = max_year - min_year + 1
+        names = getattr(communities, 'safe_names', None)
+        if names is None:
+            names = [safe_name(community) for community in communities]
         i = 0
-        for community in communities:
-            community = community.decode('utf-8')
-            community = community.replace(" ", "_")
+        for community in names:
             outdir = ''.join([out, '/', community])
             mkdir_p(outdir)
             outfile = ''.join([outdir, '/', community, '_',
@@ -93,6 +104,11 @@ class SNAPDataSet:
                                'Aug, Sep, Oct, Nov, Dec'])
             temp_data = extracted_temps[i, :]['temperature'].reshape(time_years,
                                                                      12)
+            if 'valid' in extracted_temps.dtype.names:
+                # Masked months are written as nan
+                temp_data = numpy.where(
+                    extracted_temps[i, :]['valid'].reshape(time_years, 12),
+                    temp_data, numpy.nan)
             file_data = numpy.zeros((time_years, 13))
             file_data[:, 1:] = temp_data
             file_data[:, 0] = numpy.arange(min_year, max_year+1)
@@ -122,8 +138,12 @@ class GeoRefData(SNAPDataSet):
         self.origin_y = geotransform[3]
         self.pixel_width = geotransform[1]
         self.pixel_height = geotransform[5]
+        # Sentinel for cells without data (ocean, outside the domain)
+        self.nodata = test_tiff.GetRasterBand(1).GetNoDataValue()
         # Close the file
         test_tiff = None
+        # Climate index tables, keyed by (start_year, end_year)
+        self._index_tables = {}
 
 
     def read_geotiff_as_gdal(self, month, year):
@@ -134,6 +154,8 @@ class GeoRefData(SNAPDataSet):
         :param year: desired year (4-digit integer)
         :returns: A GDAL data object
         """
+        # GDAL is slow to import, so it is only loaded once data is read
+        import gdal
         # A bit clunky, but here we assemble a SNAP-style geotiff filename
         tiff = ''.join(['/vsizip/', self.filename, '/', self.zip_dir,
                           self.prefix, str(month).zfill(2), '_',str(year),
@@ -158,6 +180,26 @@ class GeoRefData(SNAPDataSet):
         return temp_data
 
 
+    def read_geotiff_window(self, month, year, x_off, y_off, x_size, y_size):
+        """
+        Read a rectangular window of GeoTIFF Data in from ZIP dataset.
+
+        :param month: desired month (1- or 2-digit integer)
+        :param year: desired year (4-digit integer)
+        :param x_off: x-index of the window's first column
+        :param y_off: y-index of the window's first row
+        :param x_size: number of columns in the window
+        :param y_size: number of rows in the window
+        :returns: A Numpy array
+        """
+        gdal_data = self.read_geotiff_as_gdal(month, year)
+        temp_band = gdal_data.GetRasterBand(1)
+        temp_data = temp_band.ReadAsArray(x_off, y_off, x_size, y_size)
+        temp_band = None
+        gdal_data = None
+        return temp_data
+
+
     def ne_to_indices(self, northing, easting):
         """
         Convert Northings and Eastings (NAD 83 Alaska Albers Equal Area
@@ -169,11 +211,58 @@ class GeoRefData(SNAPDataSet):
         """
         x_ind = (easting - self.origin_x)/self.pixel_width
         y_ind = (northing - self.origin_y)/self.pixel_height
-        x_ind = x_ind.astype(numpy.int, copy=False)
-        y_ind = y_ind.astype(numpy.int, copy=False)
+        # Floor, so points just west or north of the grid are not
+        # truncated onto its first column or row
+        x_ind = numpy.floor(x_ind).astype(int)
+        y_ind = numpy.floor(y_ind).astype(int)
         return (x_ind, y_ind)
 
 
+    def in_domain(self, x_ind, y_ind):
+        """
+        Check which array indices fall on the grid. Indices off the grid are
+        pointed at the first cell, so they can still be used to index a
+        raster; their values must be masked with the returned flags.
+
+        :param x_ind: array x-index
+        :param y_ind: array y-index
+        :returns: x- and y-indices clamped onto the grid, and a boolean
+                  array, True where the original indices are on the grid
+        """
+        return clamp_to_grid(x_ind, y_ind, self.rows, self.cols)
+
+
+    def valid_values(self, values):
+        """
+        Check which values hold data, rather than the band's nodata value.
+
+        :param values: numpy array of values read from the dataset
+        :returns: boolean array, True where there is data
+        """
+        valid = numpy.isfinite(values)
+        if self.nodata is not None:
+            valid &= values != self.nodata
+        return valid
+
+
+    def sample_raster(self, temp_data, x_ind, y_ind, inside):
+        """
+        Index a raster at the specified array indices, masking points off
+        the grid and nodata cells.
+
+        :param temp_data: numpy array read from the dataset
+        :param x_ind: array x-indices, as returned by in_domain
+        :param y_ind: array y-indices, as returned by in_domain
+        :param inside: boolean array, as returned by in_domain
+        :returns: values (NaN where masked) and a boolean array, True where
+                  the values are valid
+        """
+        # gdal rotates for some reason, so y,x
+        values = temp_data[y_ind, x_ind].astype(numpy.float64)
+        valid = inside & self.valid_values(values)
+        return numpy.where(valid, values, numpy.nan), valid
+
+
     def indices_to_ne(self, x_ind, y_ind):
         """
         Convert index values to Northings and Eastings (NAD 83 Alaska Albers
@@ -189,7 +278,104 @@ class GeoRefData(SNAPDataSet):
         return (northing, easting)
 
 
-    def extract_points(self, northing, easting, start_year, end_year):
+    def interpolation_weights(self, northing, easting,
+                              interpolation='bilinear', neighbors=2,
+                              power=2.0):
+        """
+        Determine the neighborhood of array indices around each point, and
+        the weight each neighbor carries. Weights are relative to pixel
+        centers. Bilinear neighbors past the edge of the grid are clamped to
+        it; inverse-distance neighbors past the edge get no weight.
+
+        :param northing: position northing (in meters)
+        :param easting: position easting (in meters)
+        :param interpolation: 'bilinear' (2x2 neighborhood) or 'idw'
+                              (inverse-distance weighting)
+        :param neighbors: width of the kxk neighborhood for 'idw'
+        :param power: distance exponent for 'idw'
+        :returns: x-indices, y-indices and weights, each of shape
+                  (points, neighborhood)
+        """
+        if interpolation == 'bilinear':
+            neighbors = 2
+        elif interpolation != 'idw':
+            raise ValueError(''.join(['Unknown interpolation: ',
+                                      str(interpolation)]))
+        # Fractional position, relative to pixel centers
+        x_pos = (easting - self.origin_x)/self.pixel_width - 0.5
+        y_pos = (northing - self.origin_y)/self.pixel_height - 0.5
+        x_first = numpy.ceil(x_pos - neighbors/2.0).astype(int)
+        y_first = numpy.ceil(y_pos - neighbors/2.0).astype(int)
+        offsets = numpy.arange(neighbors)
+        # (points, rows, columns) of the neighborhood
+        x_ind = (x_first[:, None] + offsets)[:, None, :]
+        y_ind = (y_first[:, None] + offsets)[:, :, None]
+        x_ind, y_ind = numpy.broadcast_arrays(x_ind, y_ind)
+        if interpolation == 'bilinear':
+            x_frac = (x_pos - x_first)[:, None, None]
+            y_frac = (y_pos - y_first)[:, None, None]
+            weights = (numpy.where(x_ind == x_first[:, None, None],
+                                   1 - x_frac, x_frac) *
+                       numpy.where(y_ind == y_first[:, None, None],
+                                   1 - y_frac, y_frac))
+        else:
+            distance = numpy.hypot(x_ind - x_pos[:, None, None],
+                                   y_ind - y_pos[:, None, None])
+            weights = 1.0 / numpy.maximum(distance, 1e-6)**power
+            # Otherwise the clamped edge pixels would be counted again
+            weights = weights * self.in_domain(x_ind, y_ind)[2]
+        # Points off the grid get no weight at all, so they are flagged as
+        # not valid without reading anything
+        inside = self.in_domain(numpy.floor(x_pos + 0.5),
+                                numpy.floor(y_pos + 0.5))[2]
+        weights = weights * inside[:, None, None]
+        x_ind = numpy.clip(x_ind, 0, self.cols - 1)
+        y_ind = numpy.clip(y_ind, 0, self.rows - 1)
+        size = neighbors * neighbors
+        return (x_ind.reshape(-1, size), y_ind.reshape(-1, size),
+                weights.reshape(-1, size))
+
+
+    def store_month(self, extracted_temps, i, year, month, values, valid):
+        """
+        Write one month of extracted values into column i.
+
+        :param extracted_temps: numpy array from extraction_array
+        :param i: month column
+        :param year: 4-digit year
+        :param month: month (1-12)
+        :param values: numpy array with one value per point
+        :param valid: boolean array, True where the values are valid
+        """
+        extracted_temps[:, i]['temperature'] = values
+        extracted_temps[:, i]['valid'] = valid
+        extracted_temps[:, i]['year'] = year
+        extracted_temps[:, i]['month'] = month
+
+
+    def extract_month(self, extracted_temps, i, year, month, temp_data,
+                      x_offsets, y_offsets, inside):
+        """
+        Index one month's raster at the specified array indices into column
+        i, masking points off the grid and nodata cells.
+
+        :param extracted_temps: numpy array from extraction_array
+        :param i: month column
+        :param year: 4-digit year
+        :param month: month (1-12)
+        :param temp_data: numpy array read from the dataset
+        :param x_offsets: array x-indices, as returned by in_domain
+        :param y_offsets: array y-indices, as returned by in_domain
+        :param inside: boolean array, as returned by in_domain
+        """
+        values, valid = self.sample_raster(temp_data, x_offsets, y_offsets,
+                                           inside)
+        self.store_month(extracted_temps, i, year, month, values, valid)
+
+
+    def extract_points(self, northing, easting, start_year, end_year,
+                       interpolation='nearest', neighbors=2, power=2.0,
+                       out=None):
         """
         Extract points from range of years between start and end at the
         specified points (Jan->Dec). Point locations should be numpy arrays.
@@ -199,32 +385,201 @@ class GeoRefData(SNAPDataSet):
         :param start_year: 4-digit year for start of analysis period
         :param end_year: 4-digit year for end of analysis period, same as
                          start_year if only analyzing one year
+        :param interpolation: 'nearest' (value of the containing pixel),
+                              'bilinear' or 'idw' (inverse-distance weighting
+                              over a kxk neighborhood)
+        :param neighbors: width of the kxk neighborhood for 'idw'
+        :param power: distance exponent for 'idw'
+        :param out: optional array (EXTRACTED_DTYPE, one row per point and
+                    one column per month) to write the results into, such
+                    as a SharedResultBuffer view
         :returns: numpy array of extracted temperatures
         """
+        if interpolation != 'nearest':
+            x_ind, y_ind, weights = self.interpolation_weights(
+                northing, easting, interpolation, neighbors, power)
+            return self.extract_weighted(x_ind, y_ind, weights, start_year,
+                                         end_year, out)
         x_offsets, y_offsets = self.ne_to_indices(northing, easting)
+        return self.extract_pixels(x_offsets, y_offsets, start_year, end_year,
+                                   out)
+
+
+    def extract_points_async(self, northing, easting, start_year, end_year,
+                             read_ahead=2, executor=None, cancel=None):
+        """
+        asyncio version of extract_points: GeoTIFF reads run in an executor,
+        prefetching up to read_ahead months while the current one is indexed,
+        so the event loop is never blocked. Requires Python 3.7+.
+
+        :param northing: position northing (in meters)
+        :param easting: position easting (in meters)
+        :param start_year: 4-digit year for start of analysis period
+        :param end_year: 4-digit year for end of analysis period, same as
+                         start_year if only analyzing one year
+        :param read_ahead: number of months to read ahead
+        :param executor: concurrent.futures executor for the reads
+        :param cancel: optional CancellationToken to abandon the extraction
+        :returns: a coroutine that returns the numpy array of extracted
+                  temperatures
+        """
+        from ._aio import extract_points_async
+        return extract_points_async(self, northing, easting, start_year,
+                                    end_year, read_ahead=read_ahead,
+                                    executor=executor, cancel=cancel)
+
+
+    def extract_pixels(self, x_offsets, y_offsets, start_year, end_year,
+                       out=None):
+        """
+        Extract points from range of years between start and end at the
+        specified array indices (Jan->Dec).
+
+        :param x_offsets: array x-indices
+        :param y_offsets: array y-indices
+        :param start_year: 4-digit year for start of analysis period
+        :param end_year: 4-digit year for end of analysis period, same as
+                         start_year if only analyzing one year
+        :param out: optional array to write the results into
+        :returns: numpy array of extracted temperatures
+        """
         years = list(range(start_year, end_year + 1))
         months = list(range(1, 13))
-        # Record structure: (Year, Month, Temperature)
         # Each row represents a community, each column is a monthly temp.
-        extracted_temps = numpy.zeros((len(x_offsets), 12*len(years)),
-                                      dtype={'names': ['year', 'month',
-                                                       'temperature'],
-                                      'formats':['i4', 'i4', 'f4']})
+        extracted_temps = extraction_array(len(x_offsets), len(years), out)
+        # Flag points off the grid before anything is read
+        x_offsets, y_offsets, inside = self.in_domain(x_offsets, y_offsets)
         i = 0
         for year, month in itertools.product(years, months):
         #for year in years:
         #    for month in months:
             temp_data = self.read_geotiff_as_array(month, year)
-            # gdal rotates for some reason, so y,x
-            extracted_temps[:, i]['temperature'] = temp_data[y_offsets,
-                                                             x_offsets]
-            extracted_temps[:, i]['year'] = year
-            extracted_temps[:, i]['month'] = month
+            self.extract_month(extracted_temps, i, year, month, temp_data,
+                               x_offsets, y_offsets, inside)
+            temp_data = None
             i += 1
         return extracted_temps
 
 
+    def extract_weighted(self, x_ind, y_ind, weights, start_year, end_year,
+                         out=None):
+        """
+        Extract weighted averages of pixel neighborhoods from range of years
+        between start and end (Jan->Dec). Each month is a single windowed
+        read covering every neighborhood. Nodata pixels are left out and the
+        remaining weights renormalized; a point with no valid neighbors is
+        NaN and flagged as not valid.
+
+        :param x_ind: array x-indices, shape (points, neighborhood)
+        :param y_ind: array y-indices, shape (points, neighborhood)
+        :param weights: neighbor weights, shape (points, neighborhood)
+        :param start_year: 4-digit year for start of analysis period
+        :param end_year: 4-digit year for end of analysis period, same as
+                         start_year if only analyzing one year
+        :param out: optional array to write the results into
+        :returns: numpy array of extracted temperatures
+        """
+        years = list(range(start_year, end_year + 1))
+        months = list(range(1, 13))
+        extracted_temps = extraction_array(len(x_ind), len(years), out)
+        if len(x_ind) == 0:
+            return extracted_temps
+        x_off, y_off = int(x_ind.min()), int(y_ind.min())
+        x_size = int(x_ind.max()) - x_off + 1
+        y_size = int(y_ind.max()) - y_off + 1
+        x_ind = x_ind - x_off
+        y_ind = y_ind - y_off
+        i = 0
+        for year, month in itertools.product(years, months):
+            temp_data = self.read_geotiff_window(month, year, x_off, y_off,
+                                                 x_size, y_size)
+            # Neighbors are clamped onto the grid already
+            values, valid = self.sample_raster(temp_data, x_ind, y_ind, True)
+            temp_data = None
+            valid_weights = numpy.where(valid, weights, 0.0)
+            total = valid_weights.sum(axis=1)
+            weighted = numpy.where(valid, values, 0.0)
+            weighted = (weighted * valid_weights).sum(axis=1)
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                values = numpy.where(total > 0, weighted / total, numpy.nan)
+            self.store_month(extracted_temps, i, year, month, values,
+                             total > 0)
+            i += 1
+        return extracted_temps
+
+
+    def matches_index_tables(self, table, metadata):
+        """
+        Check that a stored index table was built on this dataset's grid.
+
+        :param table: a table from load_index_tables
+        :param metadata: the table's metadata
+        :returns: True if the table's grid matches the dataset's
+        """
+        return (table.shape == (self.rows, self.cols) and
+                metadata.get('rows') == self.rows and
+                metadata.get('cols') == self.cols and
+                metadata.get('origin_x') == self.origin_x and
+                metadata.get('origin_y') == self.origin_y and
+                metadata.get('pixel_width') == self.pixel_width and
+                metadata.get('pixel_height') == self.pixel_height)
+
+
+    def climate_indices(self, northing, easting, start_year, end_year,
+                        prefix=None):
+        """
+        Look up the climate indices (average air temperature, freezing and
+        thawing indices and design freezing and thawing indices) between
+        start and end at the specified points. The per-pixel index table is
+        built and stored (alongside the dataset, unless prefix says
+        otherwise) the first time a period is requested; after that a query
+        is a single lookup.
+
+        :param northing: position northing (in meters)
+        :param easting: position easting (in meters)
+        :param start_year: 4-digit year for start of analysis period
+        :param end_year: 4-digit year for end of analysis period
+        :param prefix: path prefix for the stored table, defaults to
+                       index_table_prefix (next to the dataset); use it when
+                       the dataset's directory is read-only
+        :returns: numpy array of climate indices, one record per point (NaN
+                  for points off the grid or without data)
+        """
+        if prefix is None:
+            prefix = index_table_prefix(self.filename, start_year, end_year)
+        key = (start_year, end_year, prefix)
+        if key not in self._index_tables:
+            table = None
+            if os.path.exists(''.join([prefix, '.json'])):
+                table, metadata = load_index_tables(prefix)
+                if not self.matches_index_tables(table, metadata):
+                    # Left over from another build, or another grid
+                    table = None
+            if table is None:
+                build_index_tables(self, start_year, end_year, prefix)
+                table = load_index_tables(prefix)[0]
+            self._index_tables[key] = table
+        x_offsets, y_offsets = self.ne_to_indices(northing, easting)
+        return take_index_tables(self._index_tables[key], x_offsets,
+                                 y_offsets)
+
+
 # Functions
+def extraction_array(n_points, n_years, out=None):
+    """
+    Array to hold extracted temperatures, one row per point and one column
+    per month.
+
+    :param n_points: number of points
+    :param n_years: number of years
+    :param out: optional existing array to use instead
+    :returns: numpy array of EXTRACTED_DTYPE
+    """
+    if out is not None:
+        return out
+    return numpy.zeros((n_points, 12*n_years), dtype=EXTRACTED_DTYPE)
+
+
 def mkdir_p(path):
     """
     Function to emulate mkdir -p functionality.
@@ -252,6 +607,7 @@ def wgs84_to_ne(latitude, longitude):
     :param longitude: WGS84 longitude (in decimal degrees)
     :returns: transformed coordinates to Alaska Albers
     """
+    from osgeo import osr
     wgspoint = osr.SpatialReference()
     wgspoint.ImportFromEPSG(4326)
     nepoint = osr.SpatialReference()
@@ -269,6 +625,7 @@ def ne_to_wgs(northing, easting):
     :param easting: AK Albers in meters
     :returns: transformed coordinates in WGS84 lat long
     """
+    from osgeo import osr
     wgspoint = osr.SpatialReference()
     wgspoint.ImportFromEPSG(4326)
     nepoint = osr.SpatialReference()
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+
+"""
+.. :module:: cli
+   :platform: Unix
+   :synopsis: Command-line front-end for batch extraction of community
+              temperatures from one or more SNAP datasets.
+
+.. moduleauthor:: Matthew Dillon <mrdillon@alaska.edu>
+"""
+
+import argparse
+import concurrent.futures
+import os
+import sys
+
+import numpy
+
+from ._backend import SNAPDataSet, GeoRefData, mkdir_p, EXTRACTED_DTYPE
+from ._sites import SiteCatalog
+
+
+# Datasets opened by this process, keyed by archive filename. Each pool
+# worker keeps its own, so the geotransform is only read once per worker.
+_datasets = {}
+
+
+# Functions
+def archive_years(archive):
+    """
+    Determine the year range covered by a SNAP dataset from its filename.
+
+    :param archive: path to a SNAP ZIP dataset
+    :returns: first and last year in the dataset
+    """
+    return int(archive[-13:-9]), int(archive[-8:-4])
+
+
+def checkpoint_path(checkpoint, archive, year, sites):
+    """
+    Location of the checkpoint for a single (archive, year) unit. The name
+    carries the site table's fingerprint, so a rerun with another site
+    table never picks up this one's results.
+
+    :param checkpoint: path to checkpoint directory
+    :param archive: path to a SNAP ZIP dataset
+    :param year: 4-digit year
+    :param sites: the SiteCatalog the unit is extracted for
+    :returns: path to the unit's .npy file
+    """
+    stem = os.path.splitext(os.path.basename(archive))[0]
+    return os.path.join(checkpoint, ''.join([stem, '_', sites.fingerprint(),
+                                             '_', str(year), '.npy']))
+
+
+def load_unit(checkpoint, archive, year, sites):
+    """
+    Load a finished (archive, year) unit from the checkpoint directory.
+
+    :param checkpoint: path to checkpoint directory
+    :param archive: path to a SNAP ZIP dataset
+    :param year: 4-digit year
+    :param sites: the SiteCatalog the unit is extracted for
+    :returns: numpy array of extracted temperatures, or None if the unit
+              has not been finished for this site table (or was written by
+              an older version)
+    """
+    path = checkpoint_path(checkpoint, archive, year, sites)
+    if not os.path.exists(path):
+        return None
+    temps = numpy.load(path)
+    if temps.shape != (len(sites), 12) or temps.dtype != EXTRACTED_DTYPE:
+        return None
+    return temps
+
+
+def save_unit(checkpoint, archive, year, sites, temps):
+    """
+    Atomically write a finished (archive, year) unit to the checkpoint
+    directory, so an interrupted job never leaves a partial unit behind.
+
+    :param checkpoint: path to checkpoint directory
+    :param archive: path to a SNAP ZIP dataset
+    :param year: 4-digit year
+    :param sites: the SiteCatalog the unit was extracted for
+    :param temps: numpy array of extracted temperatures
+    """
+    path = checkpoint_path(checkpoint, archive, year, sites)
+    tmp = ''.join([path, '.tmp'])
+    with open(tmp, 'wb') as f:
+        numpy.save(f, temps)
+    os.rename(tmp, path)
+
+
+def extract_into(archive, year, sites, checkpoint, out):
+    """
+    Extract one year of temperatures from one archive into out, and
+    checkpoint it.
+
+    :param archive: path to a SNAP ZIP dataset
+    :param year: 4-digit year
+    :param sites: a SiteCatalog
+    :param checkpoint: path to checkpoint directory
+    :param out: array to write the year's 12 month columns into
+    """
+    if archive not in _datasets:
+        _datasets[archive] = GeoRefData(archive)
+    sites.extract(_datasets[archive], year, year, out=out)
+    save_unit(checkpoint, archive, year, sites, out)
+
+
+def extract_unit(unit):
+    """
+    Extract one year of temperatures from one archive straight into the
+    archive's shared result buffer, and checkpoint it. This is the unit of
+    work handed to each worker; only the (archive, year) is sent back.
+
+    :param unit: tuple of (archive, year, sites, checkpoint, spec, column),
+                 where sites is a SiteCatalog, spec is the archive's
+                 SharedResultBuffer spec and column is the year's first
+                 month column in the buffer
+    :returns: the (archive, year) that was finished
+    """
+    from ._shared import SharedResultBuffer
+    archive, year, sites, checkpoint, spec, column = unit
+    with SharedResultBuffer.attach(spec) as results:
+        extract_into(archive, year, sites, checkpoint,
+                     results.array[:, column:column + 12])
+    return archive, year
+
+
+def run(sites, archives, out, start_year=None, end_year=None, jobs=1,
+        checkpoint=None, latlong=False, mp_context=None):
+    """
+    Extract monthly temperatures for every site from every archive and dump
+    them to disk. Finished (archive, year) units are checkpointed, so an
+    interrupted job can be rerun with the same arguments to pick up where
+    it left off. With more than one job, workers write into shared memory
+    rather than sending their results back.
+
+    :param sites: path to the CSV site table
+    :param archives: list of paths to SNAP ZIP datasets
+    :param out: path to output directory
+    :param start_year: 4-digit year for start of analysis period, defaults
+                       to the first year in each archive
+    :param end_year: 4-digit year for end of analysis period, defaults to
+                     the last year in each archive
+    :param jobs: number of parallel worker processes
+    :param checkpoint: path to checkpoint directory, defaults to
+                       out/.checkpoint
+    :param latlong: if True, site coordinates are WGS84
+    :param mp_context: multiprocessing context used to start the workers,
+                       defaults to the platform's start method
+    """
+    sites = SiteCatalog.from_csv(sites, latlong)
+    if checkpoint is None:
+        checkpoint = os.path.join(out, '.checkpoint')
+    mkdir_p(checkpoint)
+    if jobs > 1:
+        from ._shared import SharedResultBuffer
+
+    years = {}
+    temps = {}
+    specs = {}
+    buffers = []
+    units = []
+    try:
+        for archive in archives:
+            first, last = archive_years(archive)
+            start = first if start_year is None else max(start_year, first)
+            end = last if end_year is None else min(end_year, last)
+            years[archive] = list(range(start, end + 1))
+            shape = (len(sites), 12*len(years[archive]))
+            if jobs > 1:
+                buffers.append(SharedResultBuffer(shape))
+                specs[archive] = buffers[-1].spec
+                temps[archive] = buffers[-1].array
+            else:
+                temps[archive] = numpy.zeros(shape, dtype=EXTRACTED_DTYPE)
+            for i, year in enumerate(years[archive]):
+                unit = load_unit(checkpoint, archive, year, sites)
+                if unit is None:
+                    units.append((archive, year, 12*i))
+                else:
+                    temps[archive][:, 12*i:12*(i + 1)] = unit
+
+        if jobs > 1 and units:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                jobs, mp_context=mp_context)
+            futures = [executor.submit(extract_unit,
+                                       (archive, year, sites, checkpoint,
+                                        specs[archive], column))
+                       for archive, year, column in units]
+            try:
+                # A worker that dies breaks the pool, so the outstanding
+                # units raise BrokenProcessPool rather than waiting forever
+                for future in concurrent.futures.as_completed(futures):
+                    archive, year = future.result()
+                    print(' '.join([os.path.basename(archive), str(year)]))
+            finally:
+                for future in futures:
+                    future.cancel()
+                executor.shutdown()
+        else:
+            for archive, year, column in units:
+                extract_into(archive, year, sites, checkpoint,
+                             temps[archive][:, column:column + 12])
+                print(' '.join([os.path.basename(archive), str(year)]))
+
+        for archive in archives:
+            if years[archive]:
+                SNAPDataSet(archive).dump_raw_temperatures(sites,
+                                                           temps[archive],
+                                                           out)
+    finally:
+        # Drop the views before freeing the shared memory behind them
+        temps.clear()
+        for buffer in buffers:
+            buffer.close()
+
+
+def main(argv=None):
+    """
+    Entry point for the akextract command.
+
+    :param argv: command-line arguments, defaults to sys.argv[1:]
+    :returns: exit status
+    """
+    parser = argparse.ArgumentParser(
+        prog='akextract',
+        description='Extract monthly air temperatures at a set of sites '
+                    'from SNAP datasets.')
+    parser.add_argument('sites',
+                        help='CSV site table (Name,XCOORD,YCOORD)')
+    parser.add_argument('archives', nargs='+',
+                        help='SNAP ZIP datasets to extract from')
+    parser.add_argument('-o', '--out', default='output',
+                        help='output directory (default: %(default)s)')
+    parser.add_argument('-s', '--start-year', type=int,
+                        help='first year to extract (default: first year '
+                             'in each archive)')
+    parser.add_argument('-e', '--end-year', type=int,
+                        help='last year to extract (default: last year in '
+                             'each archive)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of parallel workers (default: '
+                             '%(default)s)')
+    parser.add_argument('--checkpoint',
+                        help='checkpoint directory (default: '
+                             'OUT/.checkpoint)')
+    parser.add_argument('--latlong', action='store_true',
+                        help='site table holds WGS84 coordinates '
+                             '(Name,LATITUDE,LONGITUDE)')
+    args = parser.parse_args(argv)
+
+    run(args.sites, args.archives, args.out, start_year=args.start_year,
+        end_year=args.end_year, jobs=args.jobs, checkpoint=args.checkpoint,
+        latlong=args.latlong)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""
+.. :module:: ensemble
+   :platform: Unix
+   :synopsis: Streaming ensemble statistics across GCM datasets.
+
+.. moduleauthor:: Matthew Dillon <mrdillon@alaska.edu>
+"""
+
+import itertools
+import warnings
+import numpy
+
+from ._backend import GeoRefData
+
+
+# Classes
+class EnsembleAccumulator:
+    """
+    Running statistics (Welford mean/variance, min/max) for every site and
+    month, updated one ensemble member at a time. Memory is fixed by the
+    number of sites and months, not by the number of members.
+
+    :param shape: (sites, months) shape of the statistics
+    """
+    def __init__(self, shape):
+        self.count = numpy.zeros(shape, dtype=numpy.int32)
+        self.mean = numpy.zeros(shape, dtype=numpy.float64)
+        self.min = numpy.empty(shape, dtype=numpy.float64)
+        self.min.fill(numpy.inf)
+        self.max = numpy.empty(shape, dtype=numpy.float64)
+        self.max.fill(-numpy.inf)
+        self._m2 = numpy.zeros(shape, dtype=numpy.float64)
+
+
+    def update(self, column, values, valid=None):
+        """
+        Fold one member's values for a single month into the statistics.
+
+        :param column: month column to update
+        :param values: numpy array with one value per site
+        :param valid: optional boolean array; sites where it is False are
+                      skipped
+        """
+        values = numpy.asarray(values, dtype=numpy.float64)
+        if valid is None:
+            valid = numpy.ones(values.shape, dtype=bool)
+        self.count[:, column] += valid
+        delta = numpy.where(valid, values - self.mean[:, column], 0.0)
+        self.mean[:, column] += delta / numpy.maximum(self.count[:, column], 1)
+        self._m2[:, column] += numpy.where(
+            valid, delta * (values - self.mean[:, column]), 0.0)
+        numpy.minimum(self.min[:, column],
+                      numpy.where(valid, values, numpy.inf),
+                      out=self.min[:, column])
+        numpy.maximum(self.max[:, column],
+                      numpy.where(valid, values, -numpy.inf),
+                      out=self.max[:, column])
+
+
+    def variance(self, ddof=0):
+        """
+        Variance across members, NaN where there are too few valid members.
+
+        :param ddof: delta degrees of freedom (0 for population, 1 for sample
+                     variance)
+        :returns: numpy array of variances
+        """
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            return numpy.where(self.count > ddof,
+                               self._m2 / (self.count - ddof), numpy.nan)
+
+
+    def std(self, ddof=0):
+        """
+        Standard deviation (spread) across members.
+
+        :param ddof: delta degrees of freedom (0 for population, 1 for sample
+                     standard deviation)
+        :returns: numpy array of standard deviations
+        """
+        return numpy.sqrt(self.variance(ddof))
+
+
+# Functions
+def extract_ensemble(datasets, northing, easting, start_year, end_year,
+                     percentiles=None):
+    """
+    Extract ensemble statistics at the specified points from a set of
+    datasets (for example the individual GCMs behind 5modelAvg). Each
+    (year, month) is read from every member in lock-step and folded into
+    running statistics, so only a single month is held per member.
+
+    :param datasets: list of GeoRefData objects or SNAP ZIP dataset filenames,
+                     all on the same grid
+    :param northing: position northing (in meters)
+    :param easting: position easting (in meters)
+    :param start_year: 4-digit year for start of analysis period
+    :param end_year: 4-digit year for end of analysis period, same as
+                     start_year if only analyzing one year
+    :param percentiles: optional sequence of percentiles (0-100) to compute
+                        exactly across members
+    :returns: numpy array of ensemble statistics (year, month, count of
+              valid members, mean, std, min, max and, if requested,
+              percentiles), one row per point; statistics without any valid
+              member are NaN
+    """
+    datasets = [dataset if isinstance(dataset, GeoRefData)
+                else GeoRefData(dataset) for dataset in datasets]
+    grid = (datasets[0].rows, datasets[0].cols, datasets[0].origin_x,
+            datasets[0].origin_y, datasets[0].pixel_width,
+            datasets[0].pixel_height)
+    for dataset in datasets[1:]:
+        # Checked up front, so a mismatch never fails partway through
+        if (dataset.rows, dataset.cols, dataset.origin_x, dataset.origin_y,
+                dataset.pixel_width, dataset.pixel_height) != grid:
+            raise ValueError(''.join(['Dataset ', dataset.filename,
+                                      ' is not on the same grid as ',
+                                      datasets[0].filename]))
+    x_offsets, y_offsets = datasets[0].ne_to_indices(northing, easting)
+    x_offsets, y_offsets, inside = datasets[0].in_domain(x_offsets, y_offsets)
+    years = list(range(start_year, end_year + 1))
+    months = list(range(1, 13))
+
+    names = ['year', 'month', 'count', 'mean', 'std', 'min', 'max']
+    formats = ['i4', 'i4', 'i4', 'f4', 'f4', 'f4', 'f4']
+    if percentiles is not None:
+        percentiles = list(percentiles)
+        names.append('percentiles')
+        formats.append(('f4', (len(percentiles),)))
+    stats = numpy.zeros((len(x_offsets), 12*len(years)),
+                        dtype={'names': names, 'formats': formats})
+    accumulator = EnsembleAccumulator(stats.shape)
+
+    i = 0
+    for year, month in itertools.product(years, months):
+        members = []
+        for dataset in datasets:
+            temp_data = dataset.read_geotiff_as_array(month, year)
+            values, valid = dataset.sample_raster(temp_data, x_offsets,
+                                                  y_offsets, inside)
+            temp_data = None
+            accumulator.update(i, values, valid)
+            if percentiles is not None:
+                members.append(values)
+        if percentiles is not None:
+            with warnings.catch_warnings():
+                # All-NaN sites (no valid members) are left as NaN
+                warnings.simplefilter('ignore', RuntimeWarning)
+                stats[:, i]['percentiles'] = numpy.nanpercentile(
+                    numpy.array(members), percentiles, axis=0).T
+        stats[:, i]['year'] = year
+        stats[:, i]['month'] = month
+        i += 1
+
+    empty = accumulator.count == 0
+    stats['count'] = accumulator.count
+    stats['mean'] = numpy.where(empty, numpy.nan, accumulator.mean)
+    stats['std'] = accumulator.std()
+    stats['min'] = numpy.where(empty, numpy.nan, accumulator.min)
+    stats['max'] = numpy.where(empty, numpy.nan, accumulator.max)
+    return stats
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+"""
+.. :module:: indices
+   :platform: Unix
+   :synopsis: Per-pixel climate index lookup tables, built once per dataset
+              and period and stored alongside the dataset.
+
+.. moduleauthor:: Matthew Dillon <mrdillon@alaska.edu>
+"""
+
+import itertools
+import json
+import os
+import uuid
+import numpy
+from numpy.lib.format import open_memmap
+
+
+# Average air temperature (deg C), average air freezing and thawing indices
+# and design air freezing and thawing indices (deg C-days)
+CLIMATE_INDICES = ('air_temperature', 'freezing_index', 'thawing_index',
+                   'design_freezing_index', 'design_thawing_index')
+
+DAYS_PER_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+INDEX_DTYPE = numpy.dtype({'names': list(CLIMATE_INDICES),
+                           'formats': ['f4'] * len(CLIMATE_INDICES)})
+
+
+# Functions
+def index_table_prefix(filename, start_year, end_year):
+    """
+    Default location of a dataset's index tables, next to the dataset.
+
+    :param filename: path to a SNAP ZIP dataset
+    :param start_year: 4-digit year for start of analysis period
+    :param end_year: 4-digit year for end of analysis period
+    :returns: path prefix for the table (.npy) and metadata (.json) files
+    """
+    return ''.join([os.path.splitext(filename)[0], '_indices_',
+                    str(start_year), '_', str(end_year)])
+
+
+def build_index_tables(dataset, start_year, end_year, prefix=None):
+    """
+    Compute the climate indices for every pixel of a dataset and store them
+    as a memory-mappable table. Each month is read once; annual freezing
+    and thawing indices are folded into running sums and the three coldest
+    and warmest years are tracked per pixel. Pixels with nodata in any
+    month are NaN in every index. Both files are written under unique
+    temporary names and renamed into place, so builders racing on the same
+    prefix never see each other's partial files.
+
+    :param dataset: a GeoRefData object
+    :param start_year: 4-digit year for start of analysis period
+    :param end_year: 4-digit year for end of analysis period
+    :param prefix: path prefix for the output files, defaults to
+                   index_table_prefix
+    :returns: path prefix of the written files
+    """
+    if prefix is None:
+        prefix = index_table_prefix(dataset.filename, start_year, end_year)
+    years = list(range(start_year, end_year + 1))
+    shape = (dataset.rows, dataset.cols)
+
+    temp_sum = numpy.zeros(shape, dtype=numpy.float64)
+    freezing_sum = numpy.zeros(shape, dtype=numpy.float64)
+    thawing_sum = numpy.zeros(shape, dtype=numpy.float64)
+    # Three largest annual indices per pixel, in ascending order
+    coldest = numpy.empty((3,) + shape, dtype=numpy.float32)
+    coldest.fill(-numpy.inf)
+    warmest = numpy.empty((3,) + shape, dtype=numpy.float32)
+    warmest.fill(-numpy.inf)
+    freezing = numpy.zeros(shape, dtype=numpy.float32)
+    thawing = numpy.zeros(shape, dtype=numpy.float32)
+    valid = numpy.ones(shape, dtype=bool)
+
+    for year, month in itertools.product(years, range(1, 13)):
+        if month == 1:
+            freezing.fill(0)
+            thawing.fill(0)
+        temp_data = dataset.read_geotiff_as_array(month, year)
+        valid &= numpy.isfinite(temp_data)
+        if dataset.nodata is not None:
+            valid &= temp_data != dataset.nodata
+        temp_sum += temp_data
+        days = DAYS_PER_MONTH[month - 1]
+        freezing -= numpy.minimum(temp_data, 0) * days
+        thawing += numpy.maximum(temp_data, 0) * days
+        temp_data = None
+        if month == 12:
+            freezing_sum += freezing
+            thawing_sum += thawing
+            _keep_largest(coldest, freezing)
+            _keep_largest(warmest, thawing)
+
+    design = min(3, len(years))
+    tmp = _temporary(prefix, '.npy')
+    try:
+        table = open_memmap(tmp, mode='w+', dtype=INDEX_DTYPE, shape=shape)
+        table['air_temperature'] = temp_sum / (12 * len(years))
+        table['freezing_index'] = freezing_sum / len(years)
+        table['thawing_index'] = thawing_sum / len(years)
+        table['design_freezing_index'] = coldest[-design:].mean(axis=0)
+        table['design_thawing_index'] = warmest[-design:].mean(axis=0)
+        for index in CLIMATE_INDICES:
+            table[index][~valid] = numpy.nan
+        table.flush()
+        table = None
+        os.rename(tmp, ''.join([prefix, '.npy']))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    metadata = {'filename': os.path.basename(dataset.filename),
+                'start_year': start_year, 'end_year': end_year,
+                'rows': dataset.rows, 'cols': dataset.cols,
+                'origin_x': dataset.origin_x, 'origin_y': dataset.origin_y,
+                'pixel_width': dataset.pixel_width,
+                'pixel_height': dataset.pixel_height}
+    tmp = _temporary(prefix, '.json')
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        os.rename(tmp, ''.join([prefix, '.json']))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return prefix
+
+
+def load_index_tables(prefix):
+    """
+    Memory-map a table written by build_index_tables.
+
+    :param prefix: path prefix of the table files
+    :returns: the table (a read-only memmap, one record per pixel) and its
+              metadata
+    """
+    with open(''.join([prefix, '.json'])) as f:
+        metadata = json.load(f)
+    table = numpy.load(''.join([prefix, '.npy']), mmap_mode='r')
+    return table, metadata
+
+
+def query_index_tables(table, metadata, northing, easting):
+    """
+    Look up the climate indices at the specified points. Point locations
+    should be numpy arrays.
+
+    :param table: a table from load_index_tables
+    :param metadata: the table's metadata
+    :param northing: position northing (in meters)
+    :param easting: position easting (in meters)
+    :returns: numpy array of climate indices, one record per point (NaN
+              for points off the grid or without data)
+    """
+    x_ind = (easting - metadata['origin_x'])/metadata['pixel_width']
+    y_ind = (northing - metadata['origin_y'])/metadata['pixel_height']
+    return take_index_tables(table, numpy.floor(x_ind).astype(int),
+                             numpy.floor(y_ind).astype(int))
+
+
+def take_index_tables(table, x_ind, y_ind):
+    """
+    Look up the climate indices at the specified array indices, with NaN
+    for indices off the grid.
+
+    :param table: a table from load_index_tables
+    :param x_ind: array x-indices
+    :param y_ind: array y-indices
+    :returns: numpy array of climate indices, one record per point
+    """
+    x_ind, y_ind, inside = clamp_to_grid(x_ind, y_ind, *table.shape)
+    # gdal rotates for some reason, so y,x
+    indices = numpy.array(table[y_ind, x_ind])
+    for index in CLIMATE_INDICES:
+        indices[index][~inside] = numpy.nan
+    return indices
+
+
+def clamp_to_grid(x_ind, y_ind, rows, cols):
+    """
+    Check which array indices fall on a grid, and point the ones that do not
+    at the first cell so they can still be used to index it.
+
+    :param x_ind: array x-indices
+    :param y_ind: array y-indices
+    :param rows: number of rows in the grid
+    :param cols: number of columns in the grid
+    :returns: clamped x- and y-indices, and a boolean array, True where the
+              original indices are on the grid
+    """
+    inside = (x_ind >= 0) & (x_ind < cols) & (y_ind >= 0) & (y_ind < rows)
+    return numpy.where(inside, x_ind, 0), numpy.where(inside, y_ind, 0), inside
+
+
+def _temporary(prefix, suffix):
+    """
+    A unique file name next to the final location, so the file can be
+    renamed into place.
+
+    :param prefix: path prefix of the final file
+    :param suffix: file extension
+    :returns: path for the temporary file
+    """
+    return ''.join([prefix, '.', uuid.uuid4().hex, '.tmp', suffix])
+
+
+def _keep_largest(largest, values):
+    """
+    Fold values into a running per-pixel list of the largest values.
+
+    :param largest: numpy array of the largest values so far, ascending
+                    along the first axis
+    :param values: numpy array of new values
+    """
+    numpy.maximum(largest[0], values, out=largest[0])
+    largest.sort(axis=0)
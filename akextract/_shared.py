@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+.. :module:: shared
+   :platform: Unix
+   :synopsis: Shared-memory result buffers for multi-process extraction.
+
+.. moduleauthor:: Matthew Dillon <mrdillon@alaska.edu>
+"""
+
+import sys
+import weakref
+from multiprocessing import shared_memory
+
+import numpy
+
+from ._backend import EXTRACTED_DTYPE
+
+
+# Classes
+class SharedResultBuffer:
+    """
+    A numpy array backed by shared memory. The parent creates the buffer and
+    hands its spec to workers, which attach and write their month columns
+    (via the out argument of extract_points) straight into it; the parent's
+    array is a zero-copy view of the results. Requires Python 3.8+.
+
+    The creating process owns the shared memory: it is unlinked when the
+    owner closes the buffer, leaves a with-block, is garbage collected or
+    exits, whether or not the workers finished cleanly. Attached workers
+    never unlink it, so a crashed worker cannot take the results with it.
+
+    :param shape: (points, months) shape of the buffer
+    :param dtype: numpy dtype of the buffer, defaults to EXTRACTED_DTYPE
+    :param name: name of an existing buffer to attach to; if None, a new
+                 buffer is created
+    """
+    def __init__(self, shape, dtype=EXTRACTED_DTYPE, name=None):
+        self.shape = tuple(shape)
+        self.dtype = numpy.dtype(dtype)
+        self.owner = name is None
+        if self.owner:
+            size = max(1, int(numpy.prod(self.shape)) * self.dtype.itemsize)
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._finalizer = weakref.finalize(self, _release, self._shm,
+                                               True)
+        else:
+            self._shm = _attach(name)
+            self._finalizer = weakref.finalize(self, _release, self._shm,
+                                               False)
+        self.name = self._shm.name
+        self.array = numpy.ndarray(self.shape, dtype=self.dtype,
+                                   buffer=self._shm.buf)
+        if self.owner:
+            self.array.fill(0)
+
+
+    @classmethod
+    def attach(cls, spec):
+        """
+        Attach to a buffer created in another process.
+
+        :param spec: the creating buffer's spec
+        :returns: a SharedResultBuffer that does not own the shared memory
+        """
+        name, shape, dtype = spec
+        return cls(shape, dtype, name)
+
+
+    @property
+    def spec(self):
+        """
+        Picklable description of the buffer, to hand to workers.
+        """
+        return (self.name, self.shape, self.dtype)
+
+
+    def close(self):
+        """
+        Drop this process's view of the buffer, and unlink the shared memory
+        if this process created it. The array must not be used afterwards.
+        """
+        self.array = None
+        self._finalizer()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Functions
+def _attach(name):
+    """
+    Attach to existing shared memory. Workers started by the owner share
+    its resource tracker, which only unlinks the memory if the owner dies
+    without doing so itself; from Python 3.13 the attachment is not tracked
+    at all.
+
+    :param name: name of the shared memory block
+    :returns: a SharedMemory object
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _release(shm, unlink):
+    """
+    Close a shared memory block, and unlink it if requested.
+
+    :param shm: a SharedMemory object
+    :param unlink: if True, also free the block
+    """
+    try:
+        shm.close()
+    except BufferError:
+        # A numpy view is still exported; the mapping goes away with it
+        pass
+    if unlink:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
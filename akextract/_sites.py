@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+"""
+.. :module:: sites
+   :platform: Unix
+   :synopsis: An in-memory catalog of extraction sites.
+
+.. moduleauthor:: Matthew Dillon <mrdillon@alaska.edu>
+"""
+
+import csv
+import hashlib
+import numpy
+
+try:
+    from sys import intern
+except ImportError:
+    # Python 2, intern is a builtin
+    pass
+
+
+# Classes
+class SiteCatalog:
+    """
+    A table of named sites, parsed once and held as interned names and
+    float64 coordinate arrays (NAD 83 Alaska Albers Equal Area Conic). The
+    filesystem-safe names used for output are derived once, and pixel
+    indices are cached per grid, so repeated extractions and dumps skip the
+    per-site conversions.
+
+    :param names: sequence of site names
+    :param northing: site northings (in meters)
+    :param easting: site eastings (in meters)
+    """
+    def __init__(self, names, northing, easting):
+        self.names = [intern(str(name)) for name in names]
+        self.safe_names = [intern(safe_name(name)) for name in self.names]
+        self.northing = numpy.asarray(northing, dtype=numpy.float64)
+        self.easting = numpy.asarray(easting, dtype=numpy.float64)
+        self._lookup = dict((name, i) for i, name in enumerate(self.names))
+        self._pixels = {}
+        self._fingerprint = None
+
+
+    @classmethod
+    def from_csv(cls, filename, latlong=False):
+        """
+        Read a site table. By default the table is expected to be in the
+        communities_dist.csv format (Name,XCOORD,YCOORD in AK Albers meters),
+        with a single header row.
+
+        :param filename: path to the CSV site table
+        :param latlong: if True, coordinates are WGS84 (Name,LATITUDE,LONGITUDE)
+        :returns: a SiteCatalog
+        """
+        names = []
+        coords = []
+        with open(filename) as f:
+            reader = csv.reader(f)
+            next(reader)
+            for row in reader:
+                if not row:
+                    continue
+                names.append(row[0].strip())
+                coords.append((float(row[1]), float(row[2])))
+        coords = numpy.array(coords, dtype=numpy.float64).reshape(-1, 2)
+        if latlong:
+            easting, northing = _project_wgs84(coords[:, 0], coords[:, 1])
+        else:
+            easting, northing = coords[:, 0], coords[:, 1]
+        return cls(names, northing, easting)
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    def __contains__(self, name):
+        return name in self._lookup
+
+
+    def __iter__(self):
+        return iter(self.names)
+
+
+    def fingerprint(self):
+        """
+        A short hash of the site names and (projected) coordinates, so
+        results stored for one site table are not mistaken for another's.
+
+        :returns: hex digest identifying the catalog's contents
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha1('\n'.join(self.names).encode('utf-8'))
+            digest.update(numpy.ascontiguousarray(self.northing).tobytes())
+            digest.update(numpy.ascontiguousarray(self.easting).tobytes())
+            self._fingerprint = digest.hexdigest()[:16]
+        return self._fingerprint
+
+
+    def index(self, name):
+        """
+        Look up a site's row in the catalog.
+
+        :param name: site name
+        :returns: row index of the site
+        """
+        return self._lookup[name]
+
+
+    def subset(self, selection):
+        """
+        Select a subset of sites. Cached pixel indices are carried over, so
+        the subset does not need to be converted again.
+
+        :param selection: sequence of site names, or a numpy integer or
+                          boolean index array
+        :returns: a new SiteCatalog
+        """
+        if not isinstance(selection, numpy.ndarray):
+            selection = numpy.fromiter((self._lookup[name]
+                                        for name in selection),
+                                       dtype=numpy.intp)
+        rows = numpy.arange(len(self.names))[selection]
+        catalog = SiteCatalog([self.names[row] for row in rows],
+                              self.northing[rows], self.easting[rows])
+        for grid, (x_ind, y_ind) in self._pixels.items():
+            catalog._pixels[grid] = (x_ind[rows], y_ind[rows])
+        return catalog
+
+
+    def pixel_indices(self, dataset):
+        """
+        Array indices of every site on a dataset's grid, computed once per
+        grid.
+
+        :param dataset: a GeoRefData object
+        :returns: x and y array indices of the sites
+        """
+        grid = (dataset.origin_x, dataset.origin_y,
+                dataset.pixel_width, dataset.pixel_height)
+        if grid not in self._pixels:
+            self._pixels[grid] = dataset.ne_to_indices(self.northing,
+                                                       self.easting)
+        return self._pixels[grid]
+
+
+    def extract(self, dataset, start_year, end_year, out=None):
+        """
+        Extract temperatures at every site in the catalog (Jan->Dec).
+
+        :param dataset: a GeoRefData object
+        :param start_year: 4-digit year for start of analysis period
+        :param end_year: 4-digit year for end of analysis period, same as
+                         start_year if only analyzing one year
+        :param out: optional array to write the results into
+        :returns: numpy array of extracted temperatures, one row per site
+        """
+        x_ind, y_ind = self.pixel_indices(dataset)
+        return dataset.extract_pixels(x_ind, y_ind, start_year, end_year,
+                                      out)
+
+
+# Functions
+def safe_name(name):
+    """
+    Name of a site as used for its output directory and files.
+
+    :param name: site name (str or UTF-8 bytes)
+    :returns: the name with spaces replaced by underscores
+    """
+    if isinstance(name, bytes):
+        name = name.decode('utf-8')
+    return name.replace(' ', '_')
+
+
+def _project_wgs84(latitude, longitude):
+    """
+    Convert arrays of WGS84 lat/long to Eastings and Northings (NAD 83
+    Alaska Albers Equal Area Conic) with a single transformation.
+
+    :param latitude: WGS84 latitudes (in decimal degrees)
+    :param longitude: WGS84 longitudes (in decimal degrees)
+    :returns: eastings and northings (in meters)
+    """
+    from osgeo import osr
+    wgspoint = osr.SpatialReference()
+    wgspoint.ImportFromEPSG(4326)
+    nepoint = osr.SpatialReference()
+    nepoint.ImportFromEPSG(3338)
+    transform = osr.CoordinateTransformation(wgspoint, nepoint)
+    points = transform.TransformPoints(list(zip(longitude.tolist(),
+                                                latitude.tolist())))
+    points = numpy.array(points, dtype=numpy.float64).reshape(-1, 3)
+    return points[:, 0], points[:, 1]
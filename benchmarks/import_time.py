@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""
+Import-time benchmark. Each scenario runs in a fresh interpreter, and
+reports the best wall time over a few runs along with whether GDAL ended
+up loaded.
+
+    $ python benchmarks/import_time.py
+"""
+
+import os
+import subprocess
+import sys
+import timeit
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = [
+    ('python', 'pass'),
+    ('import akextract', 'import akextract'),
+    ('metadata (SNAPDataSet)', 'import akextract; akextract.SNAPDataSet'),
+    ('cache (load_index_tables)',
+     'import akextract; akextract.load_index_tables'),
+    ('extraction (GeoRefData + gdal)',
+     'import akextract, gdal; akextract.GeoRefData'),
+]
+
+REPORT = ("; import sys; "
+          "sys.stdout.write(str('osgeo' in sys.modules or "
+          "'gdal' in sys.modules))")
+
+
+def run(statement, repeat=5):
+    """
+    Time a statement in a fresh interpreter.
+
+    :param statement: Python source to run
+    :param repeat: number of runs
+    :returns: best wall time in seconds, and whether GDAL was loaded
+    """
+    command = [sys.executable, '-c', statement + REPORT]
+    best = min(timeit.repeat(lambda: subprocess.check_output(command,
+                                                             cwd=ROOT),
+                             number=1, repeat=repeat))
+    gdal_loaded = subprocess.check_output(command, cwd=ROOT) == b'True'
+    return best, gdal_loaded
+
+
+if __name__ == '__main__':
+    for label, statement in SCENARIOS:
+        try:
+            best, gdal_loaded = run(statement)
+        except subprocess.CalledProcessError:
+            print('%-32s failed (missing dependency?)' % label)
+            continue
+        print('%-32s %8.1f ms   gdal loaded: %s' % (label, best * 1000,
+                                                    gdal_loaded))
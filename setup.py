@@ -18,5 +18,8 @@ setup(
     author_email='matthewrdillon@gmail.com',
     url='https://github.com/thermokarst/akextract',
     license=license,
-    packages=find_packages(exclude=('tests', 'docs'))
+    packages=find_packages(exclude=('tests', 'docs')),
+    entry_points={
+        'console_scripts': ['akextract = akextract._cli:main'],
+    }
 )
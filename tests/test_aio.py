@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the asyncio extraction front-end.
+"""
+
+import akextract
+import asyncio
+import nose
+from nose.tools import assert_equal, assert_raises
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+
+def test_extract_points_async():
+    """
+    Check that the async extraction matches extract_points.
+    """
+    filename = 'raw_data/tas_AK_771m_CRU_TS31_historical_1950_2009.zip'
+    dataset = akextract.GeoRefData(filename)
+    northings = np.array([1250935.040000, 1667062.690000])
+    eastings = np.array([214641.356000, 297703.529000])
+    extracted_temps = asyncio.run(dataset.extract_points_async(
+        northings, eastings, 2008, 2009, read_ahead=3))
+    expected = dataset.extract_points(northings, eastings, 2008, 2009)
+    assert_array_almost_equal(extracted_temps['temperature'],
+                              expected['temperature'])
+    assert_equal(extracted_temps['month'].tolist(), expected['month'].tolist())
+
+def test_extract_points_async_cancelled():
+    """
+    Check that a cancelled extraction stops with CancelledError.
+    """
+    filename = 'raw_data/tas_AK_771m_CRU_TS31_historical_1950_2009.zip'
+    dataset = akextract.GeoRefData(filename)
+    northings = np.array([1250935.040000])
+    eastings = np.array([214641.356000])
+    token = akextract.CancellationToken()
+    token.cancel()
+    assert_raises(asyncio.CancelledError, asyncio.run,
+                  dataset.extract_points_async(northings, eastings,
+                                               1950, 2009, cancel=token))
+
+if __name__ == '__main__':
+    nose.main()
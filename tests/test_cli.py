@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the akextract command-line tool.
+"""
+
+import akextract
+from akextract import _cli
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import nose
+from nose.tools import assert_equal, assert_raises
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+import os
+import shutil
+import zipfile
+
+class GridGeoRefData(akextract.GeoRefData):
+    """
+    A 4x4 grid where every pixel holds its own index (times ten) plus the
+    month, without reading any GeoTIFFs.
+    """
+    def __init__(self, filename):
+        akextract.SNAPDataSet.__init__(self, filename)
+        self.rows, self.cols = 4, 4
+        self.origin_x, self.origin_y = 0.0, 0.0
+        self.pixel_width, self.pixel_height = 1.0, -1.0
+        self.nodata = None
+        self._index_tables = {}
+
+    def read_geotiff_as_array(self, month, year):
+        return (np.arange(16, dtype=np.float32).reshape(4, 4) * 10 + month +
+                (year - 1950) * 0.5)
+
+class CrashingGeoRefData(GridGeoRefData):
+    """
+    A GridGeoRefData whose reads kill any process other than the one that
+    opened it, as a worker crashing partway through a unit would.
+    """
+    def __init__(self, filename):
+        GridGeoRefData.__init__(self, filename)
+        self.parent = os.getpid()
+
+    def read_geotiff_as_array(self, month, year):
+        if month == 6 and os.getpid() != self.parent:
+            os._exit(1)
+        return GridGeoRefData.read_geotiff_as_array(self, month, year)
+
+def grid_archive(path, dataset=GridGeoRefData):
+    """
+    Write a stub SNAP ZIP dataset for 1950-1951 and register a
+    dataset (a GridGeoRefData by default) for it, so the CLI never opens the
+    GeoTIFFs.
+    """
+    archive = os.path.join(path,
+                           'tas_AK_771m_CRU_TS31_historical_1950_1951.zip')
+    with zipfile.ZipFile(archive, 'w') as f:
+        f.writestr('tas/', '')
+        f.writestr('tas/tas_mean_C_cru_TS31_01_1950.tif', '')
+    _cli._datasets[archive] = dataset(archive)
+    return archive
+
+def test_checkpoint_roundtrip():
+    """
+    Check that a finished unit is found again on resume, and that a unit
+    run against a different site table is not.
+    """
+    path = 'output/checkpoint/'
+    akextract.mkdir_p(path)
+    shutil.rmtree(path)
+    akextract.mkdir_p(path)
+    archive = 'raw_data/tas_AK_771m_CRU_TS31_historical_1950_2009.zip'
+    sites = akextract.SiteCatalog(['A', 'B'], [0., 1.], [0., 1.])
+    temps = np.zeros((2, 12), dtype=akextract.EXTRACTED_DTYPE)
+    temps['temperature'] = 1.5
+    assert_equal(_cli.load_unit(path, archive, 2009, sites), None)
+    _cli.save_unit(path, archive, 2009, sites, temps)
+    assert_array_almost_equal(_cli.load_unit(path, archive, 2009,
+                                             sites)['temperature'],
+                              temps['temperature'])
+    moved = akextract.SiteCatalog(['A', 'B'], [0., 2.], [0., 1.])
+    assert_equal(_cli.load_unit(path, archive, 2009, moved), None)
+    more = akextract.SiteCatalog(['A', 'B', 'C'], [0., 1., 2.], [0., 1., 2.])
+    assert_equal(_cli.load_unit(path, archive, 2009, more), None)
+    assert_equal(os.listdir(path),
+                 [''.join(['tas_AK_771m_CRU_TS31_historical_1950_2009_',
+                           sites.fingerprint(), '_2009.npy'])])
+
+def test_cli_resume():
+    """
+    Extract Anchorage and Fairbanks for one year, then rerun the same job to
+    make sure the finished unit is not extracted again.
+    """
+    archive = 'raw_data/tas_AK_771m_5modelAvg_sresb1_2001_2049.zip'
+    path = 'output/cli/'
+    akextract.mkdir_p(path)
+    shutil.rmtree(path)
+    akextract.mkdir_p(path)
+    sites = os.path.join(path, 'sites.csv')
+    with open(sites, 'w') as f:
+        f.write('Name,XCOORD,YCOORD\n'
+                'Anchorage,214641.356000,1250935.040000\n'
+                'Fairbanks,297703.529000,1667062.690000\n')
+    argv = [sites, archive, '-s', '2001', '-e', '2001', '-j', '2',
+            '-o', path]
+    assert_equal(_cli.main(argv), 0)
+    unit = _cli.checkpoint_path(os.path.join(path, '.checkpoint'), archive,
+                                2001, akextract.SiteCatalog.from_csv(sites))
+    mtime = os.path.getmtime(unit)
+    assert_equal(_cli.main(argv), 0)
+    assert_equal(os.path.getmtime(unit), mtime)
+    file_list = sorted(os.listdir(path))
+    assert_equal(file_list, ['.checkpoint', 'Anchorage', 'Fairbanks',
+                             'sites.csv'])
+
+def test_cli_rerun_other_sites():
+    """
+    Rerun into the same output directory with a different site table of the
+    same size, and make sure the new sites are extracted rather than picked
+    up from the first run's checkpoints.
+    """
+    path = 'output/cli_sites/'
+    akextract.mkdir_p(path)
+    shutil.rmtree(path)
+    akextract.mkdir_p(path)
+    archive = grid_archive(path)
+    try:
+        for name, rows in [('a.csv', 'A,0.5,-0.5\nB,1.5,-1.5\n'),
+                           ('b.csv', 'C,2.5,-2.5\nD,3.5,-3.5\n')]:
+            sites = os.path.join(path, name)
+            with open(sites, 'w') as f:
+                f.write(''.join(['Name,XCOORD,YCOORD\n', rows]))
+            _cli.run(sites, [archive], path)
+    finally:
+        del _cli._datasets[archive]
+    months = np.arange(1, 13)
+    for site, pixel in [('A', 0), ('B', 5), ('C', 10), ('D', 15)]:
+        outfile = ''.join([site, '_CRU_TS31_1950_1951.txt'])
+        data = np.loadtxt(os.path.join(path, site, outfile), delimiter=',')
+        assert_array_almost_equal(data[:, 1:],
+                                  [pixel * 10 + months,
+                                   pixel * 10 + months + 0.5])
+    assert_equal(len(os.listdir(os.path.join(path, '.checkpoint'))), 4)
+
+def test_cli_worker_crash():
+    """
+    A worker dying partway through a unit fails the job instead of hanging
+    it, and the shared result buffer is still freed.
+    """
+    path = 'output/cli_crash/'
+    akextract.mkdir_p(path)
+    shutil.rmtree(path)
+    akextract.mkdir_p(path)
+    archive = grid_archive(path, CrashingGeoRefData)
+    sites = os.path.join(path, 'sites.csv')
+    with open(sites, 'w') as f:
+        f.write('Name,XCOORD,YCOORD\nA,0.5,-0.5\nB,1.5,-1.5\n')
+    blocks = set(os.listdir('/dev/shm'))
+    try:
+        # The stub dataset only reaches the workers if they are forked
+        assert_raises(BrokenProcessPool, _cli.run, sites, [archive], path,
+                      jobs=2, mp_context=multiprocessing.get_context('fork'))
+    finally:
+        del _cli._datasets[archive]
+    assert_equal(set(os.listdir('/dev/shm')) - blocks, set())
+    assert_equal(os.listdir(os.path.join(path, '.checkpoint')), [])
+
+if __name__ == '__main__':
+    nose.main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for ensemble statistics.
+"""
+
+import akextract
+import nose
+from nose.tools import assert_equal, assert_raises
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+
+class GridStub(akextract.GeoRefData):
+    """
+    A grid without any data; reading from it is an error.
+    """
+    def __init__(self, filename, rows, cols):
+        self.filename = filename
+        self.rows, self.cols = rows, cols
+        self.origin_x, self.origin_y = 0.0, 0.0
+        self.pixel_width, self.pixel_height = 1.0, -1.0
+        self.nodata = None
+        self._index_tables = {}
+
+    def read_geotiff_as_array(self, month, year):
+        raise AssertionError('read before the grids were checked')
+
+def test_accumulator_matches_numpy():
+    """
+    Check that the streaming statistics match numpy over the same members.
+    """
+    members = np.random.RandomState(0).normal(size=(5, 3, 24))
+    accumulator = akextract.EnsembleAccumulator((3, 24))
+    for member in members:
+        for column in range(24):
+            accumulator.update(column, member[:, column])
+    assert_array_almost_equal(accumulator.mean, members.mean(axis=0))
+    assert_array_almost_equal(accumulator.std(), members.std(axis=0))
+    assert_array_almost_equal(accumulator.std(ddof=1),
+                              members.std(axis=0, ddof=1))
+    assert_array_almost_equal(accumulator.min, members.min(axis=0))
+    assert_array_almost_equal(accumulator.max, members.max(axis=0))
+
+def test_extract_ensemble_identical_members():
+    """
+    An ensemble of identical members has zero spread and a mean equal to
+    the member itself.
+    """
+    filename = 'raw_data/tas_AK_771m_5modelAvg_sresb1_2001_2049.zip'
+    dataset = akextract.GeoRefData(filename)
+    northings = np.array([1250935.040000, 1667062.690000])
+    eastings = np.array([214641.356000, 297703.529000])
+    stats = akextract.extract_ensemble([dataset, filename], northings,
+                                       eastings, 2001, 2001,
+                                       percentiles=[10, 50, 90])
+    extracted_temps = dataset.extract_points(northings, eastings, 2001, 2001)
+    assert_array_almost_equal(stats['mean'], extracted_temps['temperature'])
+    assert_array_almost_equal(stats['std'], np.zeros((2, 12)))
+    assert_array_almost_equal(stats['percentiles'][:, :, 1],
+                              extracted_temps['temperature'])
+    assert_equal(stats.shape, (2, 12))
+
+def test_extract_ensemble_other_extent():
+    """
+    A member with the same origin and pixel size but a smaller extent is
+    rejected before anything is read.
+    """
+    datasets = [GridStub('big.zip', 4, 4), GridStub('small.zip', 2, 2)]
+    assert_raises(ValueError, akextract.extract_ensemble, datasets,
+                  np.array([-3.5]), np.array([3.5]), 2001, 2001)
+
+if __name__ == '__main__':
+    nose.main()
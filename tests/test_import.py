@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Tests that the package imports cheaply.
+"""
+
+import nose
+from nose.tools import assert_equal
+import subprocess
+import sys
+
+def loaded_modules(statement):
+    """
+    Run a statement in a fresh interpreter and report which of the heavy
+    modules it loaded.
+    """
+    check = ("; import sys; print(' '.join(m for m in ('gdal', 'osgeo', "
+             "'numpy') if m in sys.modules))")
+    output = subprocess.check_output([sys.executable, '-c',
+                                      statement + check])
+    return output.decode('utf-8').split()
+
+def test_import_is_lazy():
+    """
+    Importing akextract should not load GDAL or numpy.
+    """
+    assert_equal(loaded_modules('import akextract'), [])
+
+def test_metadata_and_cache_paths_skip_gdal():
+    """
+    Dataset metadata and stored index tables should not need GDAL.
+    """
+    modules = loaded_modules('import akextract; akextract.SNAPDataSet; '
+                             'akextract.load_index_tables; '
+                             'akextract.SiteCatalog')
+    assert_equal(modules, ['numpy'])
+
+if __name__ == '__main__':
+    nose.main()
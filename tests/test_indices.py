@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the climate index lookup tables.
+"""
+
+import akextract
+import concurrent.futures
+import nose
+from nose.tools import assert_equal
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+import os
+import shutil
+
+class ConstantDataSet:
+    """
+    A 2x3 grid where every pixel is the same temperature for a given month,
+    offset by a degree per year, except for one nodata pixel in 1951.
+    """
+    filename = 'output/indices/constant_1950_1953.zip'
+    rows, cols = 2, 3
+    origin_x, origin_y = 0.0, 0.0
+    pixel_width, pixel_height = 1.0, -1.0
+    nodata = -9999.0
+    temps = np.array([-20., -15., -5., 0., 5., 10.,
+                      15., 12., 5., -2., -10., -18.])
+
+    def read_geotiff_as_array(self, month, year):
+        value = self.temps[month - 1] + (year - 1950)
+        temp_data = np.zeros((self.rows, self.cols), dtype=np.float32) + value
+        if year == 1951 and month == 6:
+            temp_data[0, 0] = self.nodata
+        return temp_data
+
+class ConstantGeoRefData(ConstantDataSet, akextract.GeoRefData):
+    """
+    ConstantDataSet as a GeoRefData, without reading any GeoTIFFs.
+    """
+    def __init__(self, origin_x):
+        self.origin_x = origin_x
+        self._index_tables = {}
+
+def build_constant(prefix):
+    """
+    Worker: build the ConstantDataSet tables at prefix.
+    """
+    return akextract.build_index_tables(ConstantDataSet(), 1950, 1953, prefix)
+
+def test_build_index_tables():
+    """
+    Check the indices against a direct calculation for a synthetic dataset.
+    """
+    path = 'output/indices/'
+    akextract.mkdir_p(path)
+    shutil.rmtree(path)
+    akextract.mkdir_p(path)
+    dataset = ConstantDataSet()
+    prefix = akextract.build_index_tables(dataset, 1950, 1953)
+    table, metadata = akextract.load_index_tables(prefix)
+    assert_equal(table.shape, (2, 3))
+    assert_equal(metadata['start_year'], 1950)
+
+    days = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+    temps = np.array([dataset.temps + i for i in range(4)])
+    freezing = -(np.minimum(temps, 0) * days).sum(axis=1)
+    thawing = (np.maximum(temps, 0) * days).sum(axis=1)
+    point = akextract.query_index_tables(table, metadata, np.array([-1.5]),
+                                         np.array([2.5]))
+    assert_array_almost_equal(point['air_temperature'], [temps.mean()])
+    assert_array_almost_equal(point['freezing_index'], [freezing.mean()],
+                              decimal=3)
+    assert_array_almost_equal(point['thawing_index'], [thawing.mean()],
+                              decimal=3)
+    assert_array_almost_equal(point['design_freezing_index'],
+                              [np.sort(freezing)[-3:].mean()], decimal=3)
+    assert_array_almost_equal(point['design_thawing_index'],
+                              [np.sort(thawing)[-3:].mean()], decimal=3)
+
+def test_index_tables_mask_nodata():
+    """
+    A pixel with nodata in any month, or a point off the grid, has NaN
+    indices.
+    """
+    path = 'output/indices/'
+    akextract.mkdir_p(path)
+    shutil.rmtree(path)
+    akextract.mkdir_p(path)
+    prefix = akextract.build_index_tables(ConstantDataSet(), 1950, 1953)
+    table, metadata = akextract.load_index_tables(prefix)
+    points = akextract.query_index_tables(table, metadata,
+                                          np.array([-0.5, -0.5, -0.5]),
+                                          np.array([0.5, 1.5, -0.5]))
+    assert_equal(np.isnan(points['air_temperature']).tolist(),
+                 [True, False, True])
+    assert_equal(np.isnan(points['design_freezing_index']).tolist(),
+                 [True, False, True])
+
+def test_climate_indices():
+    """
+    Check the Anchorage average air temperature, 1950-2009, against the
+    reference temperatures.
+    """
+    filename = 'raw_data/tas_AK_771m_CRU_TS31_historical_1950_2009.zip'
+    dataset = akextract.GeoRefData(filename)
+    northings = np.array([1250935.040000])
+    eastings = np.array([214641.356000])
+    temps = np.loadtxt('tests/data/anc1950-2009.csv', delimiter=',')
+    temps = (temps - 32.0)*(5.0/9.0)
+    indices = dataset.climate_indices(northings, eastings, 1950, 2009)
+    assert_array_almost_equal(indices['air_temperature'], [temps.mean()],
+                              decimal=2)
+
+def test_climate_indices_rebuild_other_grid():
+    """
+    A stored table from another grid is rebuilt rather than reused.
+    """
+    path = 'output/indices/'
+    akextract.mkdir_p(path)
+    shutil.rmtree(path)
+    akextract.mkdir_p(path)
+    prefix = akextract.build_index_tables(ConstantDataSet(), 1950, 1953)
+    dataset = ConstantGeoRefData(100.0)
+    indices = dataset.climate_indices(np.array([-1.5]), np.array([102.5]),
+                                      1950, 1953)
+    assert_equal(np.isnan(indices['air_temperature']).tolist(), [False])
+    metadata = akextract.load_index_tables(prefix)[1]
+    assert_equal(metadata['origin_x'], 100.0)
+
+def test_build_index_tables_concurrently():
+    """
+    Several processes building the same table at once all succeed, and
+    leave only the finished table behind.
+    """
+    path = 'output/indices/'
+    akextract.mkdir_p(path)
+    shutil.rmtree(path)
+    akextract.mkdir_p(path)
+    prefix = os.path.join(path, 'shared')
+    with concurrent.futures.ProcessPoolExecutor(4) as executor:
+        list(executor.map(build_constant, [prefix] * 8))
+    assert_equal(sorted(os.listdir(path)), ['shared.json', 'shared.npy'])
+    table, metadata = akextract.load_index_tables(prefix)
+    assert_equal(table.shape, (2, 3))
+
+def test_climate_indices_prefix():
+    """
+    Tables go to the requested prefix instead of next to the dataset.
+    """
+    path = 'output/indices/'
+    akextract.mkdir_p(path)
+    shutil.rmtree(path)
+    akextract.mkdir_p(os.path.join(path, 'tables'))
+    prefix = os.path.join(path, 'tables', 'constant')
+    dataset = ConstantGeoRefData(0.0)
+    indices = dataset.climate_indices(np.array([-1.5]), np.array([2.5]),
+                                      1950, 1953, prefix)
+    assert_equal(np.isnan(indices['air_temperature']).tolist(), [False])
+    assert_equal(sorted(os.listdir(path)), ['tables'])
+    assert_equal(sorted(os.listdir(os.path.join(path, 'tables'))),
+                 ['constant.json', 'constant.npy'])
+
+if __name__ == '__main__':
+    nose.main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for interpolated extraction.
+"""
+
+import akextract
+import nose
+from nose.tools import assert_equal
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+
+class RampGeoRefData(akextract.GeoRefData):
+    """
+    A 4x4 grid whose pixels hold their column index, without reading any
+    GeoTIFFs.
+    """
+    def __init__(self):
+        self.rows, self.cols = 4, 4
+        self.origin_x, self.origin_y = 0.0, 0.0
+        self.pixel_width, self.pixel_height = 1.0, -1.0
+        self.nodata = None
+        self._index_tables = {}
+
+    def read_geotiff_as_array(self, month, year):
+        return np.tile(np.arange(self.cols, dtype=np.float32), (self.rows, 1))
+
+    def read_geotiff_window(self, month, year, x_off, y_off, x_size, y_size):
+        temp_data = self.read_geotiff_as_array(month, year)
+        return temp_data[y_off:y_off + y_size, x_off:x_off + x_size]
+
+def test_bilinear_weights():
+    """
+    Check the 2x2 neighborhood and weights for a point a quarter of the way
+    between pixel centers.
+    """
+    filename = 'raw_data/tas_AK_771m_5modelAvg_sresb1_2001_2049.zip'
+    dataset = akextract.GeoRefData(filename)
+    northings, eastings = dataset.indices_to_ne(np.array([3097.75]),
+                                                np.array([1466.0]))
+    x_ind, y_ind, weights = dataset.interpolation_weights(northings, eastings)
+    assert_equal(x_ind.tolist(), [[3097, 3098, 3097, 3098]])
+    assert_equal(y_ind.tolist(), [[1465, 1465, 1466, 1466]])
+    assert_array_almost_equal(weights, [[0.375, 0.125, 0.375, 0.125]])
+
+def test_interpolated_at_pixel_center():
+    """
+    At a pixel center, bilinear and inverse-distance interpolation both
+    reduce to the pixel's own value.
+    """
+    filename = 'raw_data/tas_AK_771m_5modelAvg_sresb1_2001_2049.zip'
+    dataset = akextract.GeoRefData(filename)
+    # Anchorage, Fairbanks
+    northings, eastings = dataset.indices_to_ne(np.array([3097.5, 3204.5]),
+                                                np.array([1465.5, 926.5]))
+    nearest = dataset.extract_points(northings, eastings, 2001, 2001)
+    bilinear = dataset.extract_points(northings, eastings, 2001, 2001,
+                                      interpolation='bilinear')
+    idw = dataset.extract_points(northings, eastings, 2001, 2001,
+                                 interpolation='idw', neighbors=3)
+    assert_array_almost_equal(bilinear['temperature'],
+                              nearest['temperature'])
+    assert_array_almost_equal(idw['temperature'], nearest['temperature'])
+    assert_equal(bilinear['month'].tolist(), nearest['month'].tolist())
+
+def test_idw_near_edge():
+    """
+    Inverse-distance neighbors past the edge of the grid get no weight,
+    rather than counting the edge pixel again.
+    """
+    dataset = RampGeoRefData()
+    # x_pos = 0.1, y_pos = 1.0 relative to pixel centers
+    northings, eastings = np.array([-1.5]), np.array([0.6])
+    x_ind, y_ind, weights = dataset.interpolation_weights(
+        northings, eastings, 'idw', neighbors=3)
+    used = weights[0] > 0
+    pixels = list(zip(x_ind[0][used].tolist(), y_ind[0][used].tolist()))
+    assert_equal(len(pixels), len(set(pixels)))
+    assert_equal(sorted(set(x_ind[0][used].tolist())), [0, 1])
+    # Weighted average of columns 0 and 1 over the on-grid neighbors
+    distance = np.hypot(np.array([0, 1] * 3) - 0.1,
+                        np.repeat([0, 1, 2], 2) - 1.0)
+    expected = (np.array([0, 1] * 3) / distance**2).sum() / \
+               (1.0 / distance**2).sum()
+    idw = dataset.extract_points(northings, eastings, 2001, 2001,
+                                 interpolation='idw', neighbors=3)
+    assert_array_almost_equal(idw['temperature'][0], [expected] * 12,
+                              decimal=5)
+
+def test_interpolated_no_points():
+    """
+    An empty point set gives an empty result, as it does for nearest.
+    """
+    dataset = RampGeoRefData()
+    empty = np.array([])
+    for interpolation in ['nearest', 'bilinear', 'idw']:
+        temps = dataset.extract_points(empty, empty, 2001, 2002,
+                                       interpolation=interpolation)
+        assert_equal(temps.shape, (0, 24))
+
+if __name__ == '__main__':
+    nose.main()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for nodata-aware extraction.
+"""
+
+import akextract
+import nose
+from nose.tools import assert_equal
+import numpy as np
+
+def test_points_off_grid_are_masked():
+    """
+    Points west of, and north of, the grid are flagged as not valid and
+    come back as NaN, rather than wrapping around to the far edge.
+    """
+    filename = 'raw_data/tas_AK_771m_5modelAvg_sresb1_2001_2049.zip'
+    dataset = akextract.GeoRefData(filename)
+    # Anchorage, then two points just off the grid
+    northings = np.array([1250935.040000, 1250935.040000,
+                          dataset.origin_y + 10.0])
+    eastings = np.array([214641.356000, dataset.origin_x - 10.0,
+                         214641.356000])
+    x_ind, y_ind = dataset.ne_to_indices(northings, eastings)
+    x_ind, y_ind, inside = dataset.in_domain(x_ind, y_ind)
+    assert_equal(inside.tolist(), [True, False, False])
+    assert_equal((x_ind[1:].tolist(), y_ind[1:].tolist()), ([0, 0], [0, 0]))
+    extracted_temps = dataset.extract_points(northings, eastings, 2001, 2001)
+    assert_equal(extracted_temps['valid'].all(axis=1).tolist(),
+                 [True, False, False])
+    assert_equal(np.isnan(extracted_temps['temperature']).all(axis=1).tolist(),
+                 [False, True, True])
+
+def test_nodata_cells_are_masked():
+    """
+    The corner of the grid is ocean, which reads as the band's nodata value;
+    it should be masked, not returned.
+    """
+    filename = 'raw_data/tas_AK_771m_5modelAvg_sresb1_2001_2049.zip'
+    dataset = akextract.GeoRefData(filename)
+    assert_equal(dataset.nodata is None, False)
+    northings, eastings = dataset.indices_to_ne(np.array([0.5]),
+                                                np.array([0.5]))
+    for interpolation in ('nearest', 'bilinear'):
+        extracted_temps = dataset.extract_points(northings, eastings,
+                                                 2001, 2001,
+                                                 interpolation=interpolation)
+        assert_equal(extracted_temps['valid'].any(), False)
+        assert_equal(np.isnan(extracted_temps['temperature']).all(), True)
+
+if __name__ == '__main__':
+    nose.main()
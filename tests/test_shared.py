@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for shared-memory result buffers.
+"""
+
+import akextract
+import multiprocessing
+import nose
+from nose.tools import assert_equal, assert_raises
+import os
+
+def fill_column(unit):
+    """
+    Worker: write a month column into a shared buffer.
+    """
+    spec, column = unit
+    with akextract.SharedResultBuffer.attach(spec) as results:
+        results.array[:, column]['temperature'] = column
+        results.array[:, column]['month'] = column + 1
+
+def crash(spec):
+    """
+    Worker: attach to a shared buffer and die without cleaning up.
+    """
+    results = akextract.SharedResultBuffer.attach(spec)
+    results.array[:, 0]['temperature'] = -1
+    os._exit(1)
+
+def test_workers_write_into_buffer():
+    """
+    Columns written by pool workers show up in the parent's view.
+    """
+    with akextract.SharedResultBuffer((3, 12)) as results:
+        pool = multiprocessing.Pool(2)
+        pool.map(fill_column, [(results.spec, i) for i in range(12)])
+        pool.close()
+        pool.join()
+        assert_equal(results.array['temperature'].tolist(),
+                     [list(range(12))] * 3)
+        assert_equal(results.array['month'][0].tolist(), list(range(1, 13)))
+
+def test_buffer_survives_worker_crash():
+    """
+    A worker dying while attached leaves the buffer intact, and the owner
+    still frees it afterwards.
+    """
+    results = akextract.SharedResultBuffer((2, 12))
+    name = results.name
+    process = multiprocessing.Process(target=crash, args=(results.spec,))
+    process.start()
+    process.join()
+    assert_equal(process.exitcode, 1)
+    assert_equal(results.array[:, 0]['temperature'].tolist(), [-1, -1])
+    results.close()
+    assert_raises(FileNotFoundError, akextract.SharedResultBuffer.attach,
+                  (name, (2, 12), akextract.EXTRACTED_DTYPE))
+
+if __name__ == '__main__':
+    nose.main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the site catalog.
+"""
+
+import akextract
+import nose
+from nose.tools import assert_equal
+import numpy as np
+from numpy.testing import assert_array_almost_equal
+
+def test_catalog_from_csv():
+    """
+    Check that the communities_dist.csv site table is parsed correctly.
+    """
+    sites = akextract.SiteCatalog.from_csv('tests/data/communities_dist.csv')
+    assert_equal(sites.names[:2], ['Adak Station', 'Afognak'])
+    assert_equal(sites.safe_names[:2], ['Adak_Station', 'Afognak'])
+    assert_equal((sites.northing[0], sites.easting[0]),
+                 (472626.47, -1537921.5))
+    assert_equal(sites.northing.dtype, np.float64)
+    assert_equal(sites.index('Afognak'), 1)
+    assert_equal('Anchorage' in sites, True)
+
+def test_catalog_subset():
+    """
+    Check that subsets by name and by mask pick the same rows, and that
+    cached pixel indices follow the subset.
+    """
+    filename = 'raw_data/tas_AK_771m_5modelAvg_sresb1_2001_2049.zip'
+    dataset = akextract.GeoRefData(filename)
+    sites = akextract.SiteCatalog.from_csv('tests/data/communities_dist.csv')
+    x_ind, y_ind = sites.pixel_indices(dataset)
+    by_name = sites.subset(['Fairbanks', 'Anchorage'])
+    mask = np.array([name in ('Anchorage', 'Fairbanks') for name in sites])
+    by_mask = sites.subset(mask)
+    assert_equal(by_name.names, ['Fairbanks', 'Anchorage'])
+    assert_equal(sorted(by_mask.names), ['Anchorage', 'Fairbanks'])
+    rows = [sites.index('Fairbanks'), sites.index('Anchorage')]
+    assert_equal(by_name.pixel_indices(dataset)[0].tolist(),
+                 x_ind[rows].tolist())
+
+def test_catalog_extract():
+    """
+    Check that extracting through the catalog matches extract_points.
+    """
+    filename = 'raw_data/tas_AK_771m_5modelAvg_sresb1_2001_2049.zip'
+    dataset = akextract.GeoRefData(filename)
+    sites = akextract.SiteCatalog.from_csv('tests/data/communities_dist.csv')
+    sites = sites.subset(['Anchorage', 'Fairbanks'])
+    extracted_temps = sites.extract(dataset, 2001, 2001)
+    expected = dataset.extract_points(sites.northing, sites.easting,
+                                      2001, 2001)
+    assert_array_almost_equal(extracted_temps['temperature'],
+                              expected['temperature'])
+
+if __name__ == '__main__':
+    nose.main()